@@ -7,90 +7,139 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 import io
+import platform
 from datetime import datetime, timedelta
 from PIL import Image as PILImage, ImageDraw, ImageFont
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import base64
+import hashlib
+import json
 import urllib.request
-import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 # Page configuration
 st.set_page_config(page_title="Georgetown Travel Form Generator", page_icon="✈️", layout="wide")
 
-# Load Excel template
-@st.cache_data
+TEMPLATE_PATH = 'Georgetown Domestic Travel Authorization Form.xlsx'
+
+# Load Excel template (read-only workbooks hold an open file handle and can't be pickled by st.cache_data)
+@st.cache_resource
 def load_excel_template():
     """Load the Excel template and identify form structure"""
-    wb = openpyxl.load_workbook('Georgetown Domestic Travel Authorization Form.xlsx')
+    wb = openpyxl.load_workbook(TEMPLATE_PATH, read_only=True, data_only=True, keep_links=False)
     ws = wb['Reimbursement Form']
     return wb, ws
 
 def chunk_list(items, chunk_size):
     """Yield successive chunks of size chunk_size from items."""
-    if items is None:
-        return []
-    return [items[i:i+chunk_size] for i in range(0, len(items), chunk_size)]
+    return [items[i:i+chunk_size] for i in range(0, len(items or ()), chunk_size)]
 
 def pad_to_length(items, length, pad_value=''):
     """Return a copy padded to given length."""
-    items = list(items)
-    if len(items) < length:
-        items.extend([pad_value] * (length - len(items)))
-    return items
+    n = len(items)
+    if n >= length:
+        return list(items)
+    # Preallocate the padded list and copy items into its head
+    padded = [pad_value] * length
+    padded[:n] = items
+    return padded
+
+def _slice_pad(seq, start, length, pad_value=''):
+    """Return seq[start:start+length] as a list padded to length, without an intermediate slice."""
+    n = len(seq)
+    return [seq[start + k] if start + k < n else pad_value for k in range(length)]
+
+# Characters dropped from numeric text inputs before parsing
+_NUMBER_INPUT_STRIP = str.maketrans('', '', '$, ')
 
 def number_text_input(label, key, value=0.0, min_value=0.0, placeholder="0.00"):
     """Text input that accepts numeric values only, with validation.
     Returns the numeric value and shows inline warnings if invalid."""
     # Initialize session state if not exists
-    if key not in st.session_state:
-        st.session_state[key] = str(value) if value else ""
+    st.session_state.setdefault(key, str(value) if value else "")
     
-    # Track validation state for this specific input
-    validation_key = f"{key}_has_error"
+    # Invalid inputs register their key in one shared set that the submit check reads
+    error_keys = st.session_state.setdefault('_error_keys', set())
     
     text_val = st.text_input(label, key=key, placeholder=placeholder)
     
     # If empty, return 0.0 (no validation needed, clear any previous errors)
     if not text_val or not text_val.strip():
-        st.session_state[validation_key] = False
+        error_keys.discard(key)
         return 0.0
     
     # Try to extract numeric value from input
-    # Remove common non-numeric characters like $, commas, spaces, etc.
-    cleaned_text = text_val.strip().replace('$', '').replace(',', '').replace(' ', '')
+    # Remove common non-numeric characters like $, commas, spaces, etc. in one pass
+    cleaned_text = text_val.strip().translate(_NUMBER_INPUT_STRIP)
     
-    # Try to parse as float
-    has_error = False
-    error_message = None
+    # Try to parse as float; anything float() rejects is invalid
     try:
         num_val = float(cleaned_text)
-        if num_val < min_value:
-            num_val = min_value
-        # Input is valid, clear error state
-        st.session_state[validation_key] = False
-        return num_val
-    except (ValueError, AttributeError):
-        # Check if there are any invalid characters
-        # Allow: integers, decimals, negative numbers
-        if not re.match(r'^-?\d+(\.\d+)?$', cleaned_text):
-            has_error = True
-            error_message = "⚠️ Invalid input. Please enter a valid number."
-    
-    # Update error state
-    st.session_state[validation_key] = has_error
-    
-    # Show warning inline if there's an error
-    if has_error and error_message:
-        st.warning(error_message)
+    except ValueError:
+        error_keys.add(key)
+        # Show warning inline
+        st.warning("⚠️ Invalid input. Please enter a valid number.")
         return 0.0
     
-    return 0.0
+    if num_val < min_value:
+        num_val = min_value
+    # Input is valid, clear error state
+    error_keys.discard(key)
+    return num_val
+
+# Cursive/signature-style fonts to try first, then common fallbacks
+SIGNATURE_FONT_PATHS = [
+    '/System/Library/Fonts/Supplemental/SnellRoundhand.ttc',  # macOS
+    '/System/Library/Fonts/Supplemental/Chalkduster.ttf',    # macOS alternative
+    'C:/Windows/Fonts/brushsc.ttf',                           # Windows
+    'C:/Windows/Fonts/BRUSHSCI.TTF',                          # Windows
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf', # Linux
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf', # Linux alternative
+    '/usr/share/fonts/truetype/noto/NotoSans-Italic.ttf',     # Linux alternative
+]
+
+# Common non-cursive fonts per OS, tried when none of the above load
+_SYSTEM = platform.system()
+_DEFAULT_FONT_CANDIDATES = {
+    'Windows': [f"{font_name}.ttf" for font_name in ['arial', 'calibri', 'times']],
+    'Linux': [
+        '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+        '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    ],
+}.get(_SYSTEM, [])
+
+# Font faces aren't picklable, so they live in st.cache_resource and survive reruns
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _get_font(path, size):
+    """Load a TrueType face once per (path, size)"""
+    return ImageFont.truetype(path, size, layout_engine=ImageFont.Layout.BASIC)
+
+@st.cache_resource(show_spinner=False)
+def _resolve_signature_font_path():
+    """Return the first signature font path that loads on this machine, or None for PIL's default font"""
+    for font_path in SIGNATURE_FONT_PATHS:
+        try:
+            ImageFont.truetype(font_path, 72)
+            return font_path
+        except (OSError, IOError, Exception):
+            continue
+    
+    # If no system font found, try common font names for this OS
+    for font_path in _DEFAULT_FONT_CANDIDATES:
+        try:
+            ImageFont.truetype(font_path, 72)
+            return font_path
+        except (OSError, IOError, Exception):
+            continue
+    return None
 
-def generate_signature_image(text, width=600, height=120, scale_factor=3):
-    """Generate a signature-style image from text with high resolution"""
+def generate_signature_image(text, width=600, height=120, scale_factor=1):
+    """Generate a signature-style image from text; scale_factor > 1 supersamples for extra-high resolution"""
     if not text or not text.strip():
         return None
     
-    # Use scale factor for high-resolution rendering (render at 3x, then scale down)
+    # FreeType antialiases glyphs at the final size, so only supersample (render larger, then scale down) when asked
     scaled_width = width * scale_factor
     scaled_height = height * scale_factor
     
@@ -98,71 +147,21 @@ def generate_signature_image(text, width=600, height=120, scale_factor=3):
     img = PILImage.new('RGB', (scaled_width, scaled_height), (255, 255, 255))
     draw = ImageDraw.Draw(img)
     
-    # Try to use a cursive/signature-style font, fallback to default
-    # Include more common paths and try PIL's built-in fonts
-    font_paths = [
-        '/System/Library/Fonts/Supplemental/SnellRoundhand.ttc',  # macOS
-        '/System/Library/Fonts/Supplemental/Chalkduster.ttf',    # macOS alternative
-        'C:/Windows/Fonts/brushsc.ttf',                           # Windows
-        'C:/Windows/Fonts/BRUSHSCI.TTF',                          # Windows
-        '/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf', # Linux
-        '/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf', # Linux alternative
-        '/usr/share/fonts/truetype/noto/NotoSans-Italic.ttf',     # Linux alternative
-    ]
-    
     # Start with larger font size (scale it too)
     font_size = 72 * scale_factor  # Larger base font size
     font = None
-    font_path_used = None
+    font_path_used = _resolve_signature_font_path()
     
-    for font_path in font_paths:
+    if font_path_used:
         try:
-            font = ImageFont.truetype(font_path, font_size)
-            font_path_used = font_path
-            break
+            font = _get_font(font_path_used, font_size)
         except (OSError, IOError, Exception):
-            continue
+            font_path_used = None
     
-    # If no system font found, try to use PIL's default font or create a simple signature style
+    # Final fallback: use PIL's default font
     if font is None:
-        try:
-            # Try common font names that might be available
-            import platform
-            system = platform.system()
-            if system == 'Windows':
-                # Try Windows common fonts
-                for font_name in ['arial', 'calibri', 'times']:
-                    try:
-                        font = ImageFont.truetype(f"{font_name}.ttf", font_size)
-                        font_path_used = font_name
-                        break
-                    except:
-                        continue
-            elif system == 'Linux':
-                # Try Linux common fonts
-                for font_path_linux in [
-                    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
-                    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-                ]:
-                    try:
-                        font = ImageFont.truetype(font_path_linux, font_size)
-                        font_path_used = font_path_linux
-                        break
-                    except:
-                        continue
-        except:
-            pass
-        
-        # Final fallback: use PIL's default font
-        if font is None:
-            try:
-                # Try to load default font with larger size
-                font = ImageFont.load_default()
-                font_size = 36 * scale_factor
-            except:
-                # Ultimate fallback
-                font = ImageFont.load_default()
-                font_size = 36 * scale_factor
+        font = ImageFont.load_default()
+        font_size = 36 * scale_factor
     
     # Calculate text dimensions first
     try:
@@ -174,13 +173,15 @@ def generate_signature_image(text, width=600, height=120, scale_factor=3):
         text_width = len(text) * font_size * 0.6
         text_height = font_size * 1.2
     
-    # Adjust font size if text is too wide to fit in available width
+    # Adjust font size if text is too wide to fit in available width.
+    # Text width scales linearly with font size, so resize once instead of stepping down.
     min_font_size = 30 * scale_factor
-    while text_width > scaled_width - (40 * scale_factor) and font_size > min_font_size:
-        font_size -= 3 * scale_factor
+    available_width = scaled_width - (40 * scale_factor)
+    if text_width > available_width and font_size > min_font_size:
+        font_size = max(min_font_size, int(font_size * available_width / text_width))
         try:
-            if font_path_used and font_path_used not in ['arial', 'calibri', 'times']:
-                font = ImageFont.truetype(font_path_used, font_size)
+            if font_path_used:
+                font = _get_font(font_path_used, font_size)
             else:
                 font = ImageFont.load_default()
         except:
@@ -233,73 +234,261 @@ def generate_signature_image(text, width=600, height=120, scale_factor=3):
                     min(scaled_height, max(int(actual_bottom), int(text_height) + padding * 2))))
     
     # Scale down using high-quality resampling for sharp, clear output
-    final_width = img.size[0] // scale_factor
-    final_height = img.size[1] // scale_factor
-    img = img.resize((final_width, final_height), PILImage.Resampling.LANCZOS)
+    if scale_factor > 1:
+        final_width = img.size[0] // scale_factor
+        final_height = img.size[1] // scale_factor
+        img = img.resize((final_width, final_height), PILImage.Resampling.LANCZOS)
     
     return img
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def generate_signature_image_cached(text, width=600, height=120, scale_factor=1):
+    """PNG bytes of generate_signature_image, memoized across reruns (None if there is no text)"""
+    img = generate_signature_image(text, width=width, height=height, scale_factor=scale_factor)
+    if img is None:
+        return None
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', optimize=False, compress_level=1)
+    return buf.getvalue()
+
 def generate_date_range(start_date, end_date, max_days=7):
-    """Generate a list of dates from start_date to end_date, formatted as MM/DD/YY"""
+    """Generate a tuple of dates from start_date to end_date, formatted as MM/DD/YY"""
     if not start_date or not end_date:
-        return [''] * max_days
-    
-    dates = []
-    current_date = start_date
-    while current_date <= end_date and len(dates) < max_days:
-        # Format as MM/DD/YY
-        formatted_date = current_date.strftime('%m/%d/%y')
-        dates.append(formatted_date)
-        current_date += timedelta(days=1)
+        return ('',) * max_days
     
-    # Fill remaining slots with empty strings
-    while len(dates) < max_days:
-        dates.append('')
-    
-    return dates
+    # Format the whole range in one pass and fill remaining slots with empty strings
+    n_dates = max(0, min((end_date - start_date).days + 1, max_days))
+    return tuple((start_date + timedelta(days=i)).strftime('%m/%d/%y') for i in range(n_dates)) + ('',) * (max_days - n_dates)
+
+RED_FILL_RGB = frozenset(('FFFF0000',))
 
 def get_red_cells(ws):
     """Identify all cells that should be filled (red highlighted)"""
     red_cells = {}
     for row in ws.iter_rows():
         for cell in row:
-            if cell.fill and cell.fill.start_color and cell.fill.start_color.rgb:
-                fill_color = cell.fill.start_color.rgb
-                if fill_color == 'FFFF0000':  # Red color
-                    cell_ref = cell.coordinate
-                    row_num = cell.row
-                    col_num = cell.column
-                    if cell.value is None or str(cell.value).strip() == "" or str(cell.value) == "None":
-                        red_cells[cell_ref] = {
-                            'row': row_num,
-                            'col': col_num,
-                            'value': None
-                        }
-                    else:
-                        # Some red cells have formulas or values, we'll track them too
-                        red_cells[cell_ref] = {
-                            'row': row_num,
-                            'col': col_num,
-                            'value': cell.value
-                        }
+            # Unstyled cells (and read-only EmptyCells) can't be red, so skip the style lookup
+            if not getattr(cell, 'has_style', False):
+                continue
+            fill = cell.fill
+            start_color = fill.start_color if fill else None
+            if start_color is not None and start_color.rgb in RED_FILL_RGB:  # Red color
+                cell_ref = cell.coordinate
+                row_num = cell.row
+                col_num = cell.column
+                if cell.value is None or str(cell.value).strip() == "" or str(cell.value) == "None":
+                    red_cells[cell_ref] = {
+                        'row': row_num,
+                        'col': col_num,
+                        'value': None
+                    }
+                else:
+                    # Some red cells have formulas or values, we'll track them too
+                    red_cells[cell_ref] = {
+                        'row': row_num,
+                        'col': col_num,
+                        'value': cell.value
+                    }
     return red_cells
 
-def create_pdf(form_data, ws):
-    """Create PDF with form data and red highlighting"""
-    meal_deductions = {
-        68: { 'breakfast': 16, 'lunch': 19, 'dinner': 28, 'incidental': 5, 'first_last': 51.00 },
-        74: { 'breakfast': 18, 'lunch': 20, 'dinner': 31, 'incidental': 5, 'first_last': 55.50 },
-        80: { 'breakfast': 20, 'lunch': 22, 'dinner': 33, 'incidental': 5, 'first_last': 60.00 },
-        86: { 'breakfast': 22, 'lunch': 23, 'dinner': 36, 'incidental': 5, 'first_last': 64.50 },
-        92: { 'breakfast': 23, 'lunch': 26, 'dinner': 38, 'incidental': 5, 'first_last': 69.00 },
-    }
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, 
-                            rightMargin=0.5*inch, leftMargin=0.5*inch,
-                            topMargin=0.5*inch, bottomMargin=0.5*inch)
+# Load, trim and whiten logo from URL and size by target height
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_logo_image(url: str, target_height_inch: float):
+    """Return (png_bytes, width, height) for a logo; raises if it can't be fetched so failures aren't cached"""
+    with urllib.request.urlopen(url) as resp:
+        data = resp.read()
+    img_pil = PILImage.open(io.BytesIO(data)).convert('RGB')
+    # Replace near-black background with white and trim borders
+    arr = np.array(img_pil)
+    # Replace very dark pixels with white to avoid giant black boxes
+    dark = (arr[..., 0] < 20) & (arr[..., 1] < 20) & (arr[..., 2] < 20)
+    arr[dark] = (255, 255, 255)
+    # Create trim mask for white background to crop extra whitespace (same integer luma as PIL's convert('L'))
+    rgb = arr.astype(np.uint32)
+    gray = (rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000) >> 16
+    nonwhite = gray <= 250
+    # Bounding box of non-white areas
+    rows = np.flatnonzero(nonwhite.any(axis=1))
+    if rows.size:
+        cols = np.flatnonzero(nonwhite.any(axis=0))
+        arr = arr[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    img_pil = PILImage.fromarray(arr)
+    # Scale by target height
+    target_h = target_height_inch * inch
+    w, h = img_pil.size
+    aspect = w / h if h else 1.0
+    target_w = target_h * aspect
+    buf = io.BytesIO()
+    img_pil.save(buf, format='PNG', optimize=False, compress_level=1)
+    return buf.getvalue(), target_w, target_h
+
+def logo_image(url, target_height_inch):
+    """ReportLab Image for a cached logo, or None if it could not be loaded"""
+    try:
+        png_bytes, width, height = load_logo_image(url, target_height_inch)
+    except Exception:
+        return None
+    return Image(io.BytesIO(png_bytes), width=width, height=height)
+
+# Per diem rate -> (breakfast, lunch, dinner) dollar deduction for each provided meal
+MEAL_DEDUCTIONS = {
+    68: (16, 19, 28),
+    74: (18, 20, 31),
+    80: (20, 22, 33),
+    86: (22, 23, 36),
+    92: (23, 26, 38),
+}
+# Same deductions as a (rate, meal) array indexed by position in the sorted rate tuple
+# (sorted explicitly: meal_deduction_totals looks rates up with np.searchsorted)
+PER_DIEM_RATES = tuple(sorted(MEAL_DEDUCTIONS))
+DEFAULT_RATE_INDEX = PER_DIEM_RATES.index(80)
+_PER_DIEM_RATE_ARRAY = np.array(PER_DIEM_RATES)
+MEAL_DEDUCTION_TABLE = np.array([MEAL_DEDUCTIONS[rate] for rate in PER_DIEM_RATES], dtype=float)
+
+# Row labels for the meal deduction rows of the per diem table
+MEAL_DEDUCTION_LABELS = {
+    rate: (f"Breakfast -${bf}", f"Lunch -${lu}", f"Dinner -${di}")
+    for rate, (bf, lu, di) in MEAL_DEDUCTIONS.items()
+}
+
+def meal_deduction_totals(base_amounts, breakfast_checks, lunch_checks, dinner_checks):
+    """Dollar deduction per day for the checked meals, looked up by each day's base per diem.
+    All four lists must have one entry per day."""
+    base = np.asarray(base_amounts, dtype=float)
+    # Rates outside the table fall back to the $80 row
+    rate_idx = np.searchsorted(_PER_DIEM_RATE_ARRAY, base).clip(max=len(PER_DIEM_RATES) - 1)
+    rate_idx[_PER_DIEM_RATE_ARRAY[rate_idx] != base] = DEFAULT_RATE_INDEX
+    checks = np.array([breakfast_checks, lunch_checks, dinner_checks], dtype=bool).T
+    return (checks * MEAL_DEDUCTION_TABLE[rate_idx]).sum(axis=1)
+
+def compute_per_diem(dated, base_amounts, breakfast_checks, lunch_checks, dinner_checks):
+    """Per-day (adjusted, meal totals, reductions) lists and the trip total; undated days are zero and
+    the first and last dated days get 75% of their meal total"""
+    n = len(dated)
+    if not dated.any():
+        # No per diem days claimed (e.g. mileage-only trips)
+        return [0.0] * n, [0.0] * n, [0.0] * n, 0.0
+    # Convert the rates once; meal_deduction_totals reuses the same float array
+    base = np.asarray(base_amounts, dtype=float)
+    deductions = np.where(dated, meal_deduction_totals(base, breakfast_checks, lunch_checks, dinner_checks), 0.0)
+    # Base already includes incidentals; do not add +$5 here
+    pre75 = np.where(dated, np.maximum(0.0, base - deductions), 0.0)
+    # Apply 75% for first and last day
+    scale = np.ones(n)
+    scale[[dated.argmax(), n - 1 - dated[::-1].argmax()]] = 0.75
+    # Amounts are whole dollars or quarters, so np.round matches round() here
+    adjusted = np.round(pre75 * scale, 2)
+    # Total the array directly instead of walking the converted list a second time
+    return adjusted.tolist(), np.round(pre75, 2).tolist(), np.round(deductions, 2).tolist(), float(adjusted.sum())
+
+_format_money = "${:.2f}".format
+
+def _money_cells(values):
+    """Format amounts as $0.00 cells, leaving zero/empty amounts blank"""
+    return [_format_money(x) if x else '' for x in values]
+
+# Fixed-layout table styles, cached across reruns like the paragraph styles below
+@st.cache_resource(show_spinner=False)
+def get_table_styles():
+    """Return the mileage, per diem, totals and signature TableStyles"""
+    # Mileage tables share one fixed layout across 7-day chunks
+    mileage_table_style = TableStyle([
+        # Headers and date row set to white for print
+        ('BACKGROUND', (0, 0), (-1, 0), colors.white),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('BACKGROUND', (1, 0), (7, 0), colors.white),
+        ('TEXTCOLOR', (1, 0), (7, 0), colors.black),
+        ('BACKGROUND', (0, 1), (0, 1), colors.HexColor('#E0E0E0')),
+        ('TEXTCOLOR', (1, 1), (7, 1), colors.red),
+        ('BACKGROUND', (1, 1), (7, 1), colors.HexColor('#FFF5F5')),
+        ('BACKGROUND', (0, 2), (0, 2), colors.HexColor('#E0E0E0')),
+        ('TEXTCOLOR', (1, 2), (7, 2), colors.red),
+        ('BACKGROUND', (1, 2), (7, 2), colors.HexColor('#FFF5F5')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('TEXTCOLOR', (8, 2), (8, 2), colors.red),
+        ('BACKGROUND', (8, 2), (8, 2), colors.HexColor('#FFF5F5')),
+    ])
     
-    story = []
+    # Per diem tables share one fixed layout across 7-day chunks
+    per_diem_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E0E0E0')),
+        # Date row and header white
+        ('BACKGROUND', (1, 0), (7, 0), colors.white),
+        ('TEXTCOLOR', (1, 0), (7, 0), colors.black),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.white),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('TEXTCOLOR', (1, 1), (-1, -1), colors.red),
+        ('BACKGROUND', (1, 1), (-1, -1), colors.HexColor('#FFF5F5')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('SPAN', (0, 2), (7, 2)),
+        ('BACKGROUND', (0, 2), (7, 2), colors.HexColor('#FFF5F5')),
+        ('TEXTCOLOR', (0, 2), (7, 2), colors.red),
+        ('TEXTCOLOR', (8, -1), (8, -1), colors.red),
+        ('BACKGROUND', (8, -1), (8, -1), colors.HexColor('#FFF5F5')),
+    ])
+    
+    # Category totals and amount due
+    totals_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.white),
+        ('TEXTCOLOR', (1, 0), (1, 7), colors.red),
+        ('BACKGROUND', (1, 0), (1, 7), colors.HexColor('#FFF5F5')),
+        ('BACKGROUND', (0, 8), (0, 8), colors.white),
+        ('BACKGROUND', (1, 8), (1, 8), colors.HexColor('#FFF5F5')),
+        ('TEXTCOLOR', (1, 8), (1, 8), colors.red),
+        ('FONTNAME', (0, 8), (0, 8), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.white]),
+        ('TEXTCOLOR', (0, 9), (1, 9), colors.red),
+        ('BACKGROUND', (0, 9), (1, 9), colors.white),
+        ('FONTNAME', (0, 9), (1, 9), 'Helvetica-Bold'),
+    ])
+    
+    # Traveler signature, approvals and award numbers
+    signature_table_style = TableStyle([
+        # Grid and alignment for all rows
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        # Padding for all rows
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        # Traveler Signature row (row 0) - all white background, signature/date cells red text
+        ('BACKGROUND', (0, 0), (-1, 0), colors.white),
+        ('TEXTCOLOR', (1, 0), (1, 0), colors.red),
+        ('TEXTCOLOR', (3, 0), (3, 0), colors.red),
+        # Operations rows (rows 1-3) - all white background
+        ('BACKGROUND', (0, 1), (-1, 3), colors.white),
+    ])
+    return mileage_table_style, per_diem_table_style, totals_table_style, signature_table_style
+
+# Paragraph styles are read-only once built, so they are cached across reruns; Paragraphs themselves
+# keep layout state from wrap() and are still created per build
+@st.cache_resource(show_spinner=False)
+def get_pdf_styles():
+    """Return the sample stylesheet plus the title, misc-label and signature-label paragraph styles"""
     styles = getSampleStyleSheet()
+    
     title_style = ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
@@ -308,55 +497,105 @@ def create_pdf(form_data, ws):
         spaceAfter=12,
         alignment=1  # Center
     )
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
+    
+    # Misc expense labels wrap inside the 1.3in label column
+    misc_label_style = ParagraphStyle(
+        'MiscLabelStyle',
         parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=12,
-        alignment=1  # Center
+        fontSize=8,
+        fontName='Helvetica',
+        alignment=0,  # LEFT
+        leading=10,  # Line spacing
+        leftIndent=0,
+        rightIndent=0,
     )
     
-    # Helper to load, trim and whiten logo from URL and size by target height
-    def load_logo_image(url: str, target_height_inch: float):
-        try:
-            with urllib.request.urlopen(url) as resp:
-                data = resp.read()
-            img_pil = PILImage.open(io.BytesIO(data)).convert('RGB')
-            # Replace near-black background with white and trim borders
-            pixels = img_pil.load()
-            width, height = img_pil.size
-            # Replace very dark pixels with white to avoid giant black boxes
-            for y in range(height):
-                for x in range(width):
-                    r, g, b = pixels[x, y]
-                    if r < 20 and g < 20 and b < 20:
-                        pixels[x, y] = (255, 255, 255)
-            # Create trim mask for white background to crop extra whitespace
-            gray = img_pil.convert('L')
-            # Inverse mask of non-white areas
-            mask = gray.point(lambda p: 0 if p > 250 else 255)
-            bbox = mask.getbbox()
-            if bbox:
-                img_pil = img_pil.crop(bbox)
-            # Scale by target height
-            target_h = target_height_inch * inch
-            w, h = img_pil.size
-            aspect = w / h if h else 1.0
-            target_w = target_h * aspect
-            buf = io.BytesIO()
-            img_pil.save(buf, format='PNG')
-            buf.seek(0)
-            return Image(buf, width=target_w, height=target_h)
-        except Exception:
-            return None
+    # Labels in the approval signatures table
+    label_style = ParagraphStyle(
+        'LabelStyle',
+        parent=styles['Normal'],
+        fontSize=9,
+        fontName='Helvetica',
+        alignment=0,  # LEFT
+    )
+    return styles, title_style, misc_label_style, label_style
+
+def _build_expense_style(misc_row1_idx, misc_row2_idx, last_row):
+    """TableStyle for an expense chunk; only the optional misc rows vary between forms"""
+    # Build table style - dynamically handle misc rows
+    table_style = [
+        # Left label column light gray; headers white
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E0E0E0')),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.white),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('BACKGROUND', (1, 0), (7, 0), colors.white),
+        ('TEXTCOLOR', (1, 0), (7, 0), colors.black),
+        ('TEXTCOLOR', (1, 1), (7, 5), colors.red),
+        ('BACKGROUND', (1, 1), (7, 5), colors.HexColor('#FFF5F5')),
+        ('SPAN', (0, 6), (7, 6)),  # Span across all day columns
+        ('TEXTCOLOR', (0, 6), (0, 6), colors.black),
+        ('BACKGROUND', (0, 6), (7, 6), colors.white),
+    ]
+    
+    # Add styling for misc rows only if they exist
+    if misc_row1_idx is not None:
+        table_style.extend([
+            ('TEXTCOLOR', (0, misc_row1_idx), (0, misc_row1_idx), colors.black),
+            ('BACKGROUND', (0, misc_row1_idx), (0, misc_row1_idx), colors.HexColor('#E0E0E0')),
+            ('TEXTCOLOR', (1, misc_row1_idx), (7, misc_row1_idx), colors.red),
+            ('BACKGROUND', (1, misc_row1_idx), (7, misc_row1_idx), colors.HexColor('#FFF5F5')),
+            ('TEXTCOLOR', (8, misc_row1_idx), (8, misc_row1_idx), colors.red),
+            ('BACKGROUND', (8, misc_row1_idx), (8, misc_row1_idx), colors.HexColor('#FFF5F5')),
+        ])
+    if misc_row2_idx is not None:
+        table_style.extend([
+            ('TEXTCOLOR', (0, misc_row2_idx), (0, misc_row2_idx), colors.black),
+            ('BACKGROUND', (0, misc_row2_idx), (0, misc_row2_idx), colors.HexColor('#E0E0E0')),
+            ('TEXTCOLOR', (1, misc_row2_idx), (7, misc_row2_idx), colors.red),
+            ('BACKGROUND', (1, misc_row2_idx), (7, misc_row2_idx), colors.HexColor('#FFF5F5')),
+            ('TEXTCOLOR', (8, misc_row2_idx), (8, misc_row2_idx), colors.red),
+            ('BACKGROUND', (8, misc_row2_idx), (8, misc_row2_idx), colors.HexColor('#FFF5F5')),
+        ])
+    
+    # Add common styling for totals column
+    table_style.extend([
+        ('TEXTCOLOR', (8, 1), (8, last_row), colors.red),
+        ('BACKGROUND', (8, 1), (8, last_row), colors.HexColor('#FFF5F5')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (7, -1), 'CENTER'),
+        ('ALIGN', (8, 0), (8, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ])
+    return TableStyle(table_style)
 
+def create_pdf(form_data, ws):
+    """Create PDF with form data and red highlighting.
+    Returns (buffer, logos_loaded); logos_loaded is False if either header logo could not be fetched."""
+    get = form_data.get
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, 
+                            rightMargin=0.5*inch, leftMargin=0.5*inch,
+                            topMargin=0.5*inch, bottomMargin=0.5*inch)
+    
+    story = []
+    styles, title_style, misc_label_style, label_style = get_pdf_styles()
+    mileage_table_style, per_diem_table_style, totals_table_style, signature_table_style = get_table_styles()
+    
     # Logos beside title
     georgetown_logo_url = 'https://raw.githubusercontent.com/JiaqinWu/HRSA64_Dash/main/Georgetown_logo_blueRGB.png'
     advance_logo_url = 'https://raw.githubusercontent.com/JiaqinWu/HRSA64_Dash/main/ADVANCE%20Logo_Horizontal%20Blue.png'
 
-    left_logo = load_logo_image(georgetown_logo_url, target_height_inch=0.8)
-    right_logo = load_logo_image(advance_logo_url, target_height_inch=0.4)
+    # Fetch both logos concurrently so a cache miss costs one round trip, not two; workers share
+    # this run's Streamlit context so st.cache_data treats them like the script thread
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=2, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        left_future = pool.submit(logo_image, georgetown_logo_url, 0.8)
+        right_future = pool.submit(logo_image, advance_logo_url, 0.4)
+    left_logo, right_logo = left_future.result(), right_future.result()
 
     title_para = Paragraph("Domestic Travel Authorization Form", title_style)
 
@@ -402,12 +641,12 @@ def create_pdf(form_data, ws):
     
     # Create traveler info table
     traveler_data = [
-        ['Name', form_data.get('name', ''), 'Organization', form_data.get('organization', 'Georgetown University')],
-        ['Address Line 1', form_data.get('address1', ''), 'Destination', form_data.get('destination', '')],
-        ['Address Line 2', form_data.get('address2', ''), 'Departure Date', form_data.get('departure_date', '')],
-        ['City', form_data.get('city', ''), 'Return Date', form_data.get('return_date', '')],
-        ['State', form_data.get('state', ''), 'Email Address', form_data.get('email', '')],
-        ['Zip', form_data.get('zip', ''), '', '']
+        ['Name', get('name', ''), 'Organization', get('organization', 'Georgetown University')],
+        ['Address Line 1', get('address1', ''), 'Destination', get('destination', '')],
+        ['Address Line 2', get('address2', ''), 'Departure Date', get('departure_date', '')],
+        ['City', get('city', ''), 'Return Date', get('return_date', '')],
+        ['State', get('state', ''), 'Email Address', get('email', '')],
+        ['Zip', get('zip', ''), '', '']
     ]
     
     traveler_table = Table(traveler_data, colWidths=[1.5*inch, 1.8*inch, 1.5*inch, 1.8*inch])
@@ -441,17 +680,22 @@ def create_pdf(form_data, ws):
     story.append(Spacer(1, 0.1*inch))
     
     # Mileage: build multiple tables, 7 days per table
-    all_mileage_dates = form_data.get('mileage_dates', [])
-    all_mileage_amounts = form_data.get('mileage_amounts', [])
+    all_mileage_dates = get('mileage_dates', [])
+    all_mileage_amounts = get('mileage_amounts', [])
     # Grand total for mileage rate across all days
-    grand_mileage_rate_total = 0.0
+    # Parse each amount once; blank or unparseable amounts get no rate cell and add nothing to the total
+    mileage_values = []
+    mileage_valid = []
     for amount in all_mileage_amounts:
-        if amount and str(amount).strip():
-            try:
-                grand_mileage_rate_total += round(float(amount) * 0.70, 0)
-            except:
-                pass
-    grand_mileage_rate_total = round(grand_mileage_rate_total, 0)
+        try:
+            value = float(amount) if amount and str(amount).strip() else None
+        except:
+            value = None
+        mileage_valid.append(value is not None)
+        mileage_values.append(value or 0.0)
+    mileage_rate_values = np.round(np.array(mileage_values, dtype=float) * 0.70)
+    grand_mileage_rate_total = round(float(mileage_rate_values.sum()), 0)
+    mileage_rate_cells = [f"${int(rate)}" if ok else '' for rate, ok in zip(mileage_rate_values.tolist(), mileage_valid)]
     mileage_tables = []
     mileage_dates_chunks = chunk_list(all_mileage_dates, 7)
     mileage_amount_chunks = chunk_list(all_mileage_amounts, 7)
@@ -463,347 +707,158 @@ def create_pdf(form_data, ws):
         amounts_chunk = pad_to_length(amounts_chunk, 7, '')
         mileage_data = [['Date (MM/DD/YY)'] + dates_chunk + ['Total']]
         mileage_data.append(['MILEAGE (Per Day)'] + [str(x) if x else '' for x in amounts_chunk] + [''])
-        # Calculate mileage rates per chunk
-        mileage_rates = []
-        for amount in amounts_chunk:
-            if amount and str(amount).strip():
-                try:
-                    rate = round(float(amount) * 0.70, 0)
-                    mileage_rates.append(f"${int(rate)}")
-                except:
-                    mileage_rates.append('')
-            else:
-                mileage_rates.append('')
+        mileage_rates = _slice_pad(mileage_rate_cells, idx*7, 7, '')
         # Only last table shows grand total; others blank
         mileage_total_cell = f"${int(grand_mileage_rate_total)}" if idx == total_mileage_chunks - 1 else ''
         mileage_data.append(['Mileage Rate'] + mileage_rates + [mileage_total_cell])
         mileage_table = Table(mileage_data, colWidths=[1.3*inch] + [0.7*inch]*7 + [0.75*inch])
-        mileage_table.setStyle(TableStyle([
-            # Headers and date row set to white for print
-            ('BACKGROUND', (0, 0), (-1, 0), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('BACKGROUND', (1, 0), (7, 0), colors.white),
-            ('TEXTCOLOR', (1, 0), (7, 0), colors.black),
-            ('BACKGROUND', (0, 1), (0, 1), colors.HexColor('#E0E0E0')),
-            ('TEXTCOLOR', (1, 1), (7, 1), colors.red), 
-            ('BACKGROUND', (1, 1), (7, 1), colors.HexColor('#FFF5F5')),
-            ('BACKGROUND', (0, 2), (0, 2), colors.HexColor('#E0E0E0')),
-            ('TEXTCOLOR', (1, 2), (7, 2), colors.red), 
-            ('BACKGROUND', (1, 2), (7, 2), colors.HexColor('#FFF5F5')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('TEXTCOLOR', (8, 2), (8, 2), colors.red),
-            ('BACKGROUND', (8, 2), (8, 2), colors.HexColor('#FFF5F5')),
-        ]))
+        mileage_table.setStyle(mileage_table_style)
         mileage_tables.append(mileage_table)
-    for t in mileage_tables:
-        story.append(t)
-        story.append(Spacer(1, 0.15*inch))
+    story.extend(x for t in mileage_tables for x in (t, Spacer(1, 0.15*inch)))
     
     # Expenses Section - 7 days + total column
     story.append(Paragraph("<b>Airfare, Transportation, Parking, Lodging, Miscellaneous.</b>", styles['Heading3']))
     story.append(Paragraph("Ground Transportation Includes: Taxi, Uber, etc.", styles['Normal']))
     story.append(Paragraph("Miscellaneous/Other: Pre-approved travel expenses not listed in this form", styles['Normal']))
     story.append(Spacer(1, 0.1*inch))
-    expense_dates = form_data.get('expense_dates', [])
-    airfare = form_data.get('airfare', [])
-    ground_transport = form_data.get('ground_transport', [])
-    parking = form_data.get('parking', [])
-    lodging = form_data.get('lodging', [])
-    baggage = form_data.get('baggage', [])
-    misc = form_data.get('misc', [])
-    misc2 = form_data.get('misc2', [])  # Second row for misc expenses
+    expense_dates = get('expense_dates', [])
+    airfare = get('airfare', [])
+    ground_transport = get('ground_transport', [])
+    parking = get('parking', [])
+    lodging = get('lodging', [])
+    baggage = get('baggage', [])
+    misc = get('misc', [])
+    misc2 = get('misc2', [])  # Second row for misc expenses
     
     # Build labels; only use if descriptions are actually provided
-    misc_desc1_val = form_data.get('misc_desc1', '').strip() if form_data.get('misc_desc1', '') else ''
-    misc_desc2_val = form_data.get('misc_desc2', '').strip() if form_data.get('misc_desc2', '') else ''
-    
-    # Create Paragraph style for misc labels that allows text wrapping
-    # Column width is 1.3*inch, so set width slightly less to account for padding
-    misc_label_style = ParagraphStyle(
-        'MiscLabelStyle',
-        parent=styles['Normal'],
-        fontSize=8,
-        fontName='Helvetica',
-        alignment=0,  # LEFT
-        leading=10,  # Line spacing
-        leftIndent=0,
-        rightIndent=0,
-    )
+    misc_desc1_val = (get('misc_desc1', '') or '').strip()
+    misc_desc2_val = (get('misc_desc2', '') or '').strip()
     
     # Convert misc labels to Paragraph objects for text wrapping
     # Only show misc rows that have actual descriptions
     misc_label1 = Paragraph(misc_desc1_val, misc_label_style) if misc_desc1_val else None
     misc_label2 = Paragraph(misc_desc2_val, misc_label_style) if misc_desc2_val else None
     
-    # Grand totals across all days
-    grand_af = sum(x for x in airfare if x)
-    grand_gt = sum(x for x in ground_transport if x)
-    grand_pk = sum(x for x in parking if x)
-    grand_lg = sum(x for x in lodging if x)
-    grand_bg = sum(x for x in baggage if x)
-    grand_m1 = sum(x for x in misc if x)
-    grand_m2 = sum(x for x in misc2 if x)
+    # Grand totals across all days: one row per category, summed in a single vectorized pass
+    expense_categories = [airfare, ground_transport, parking, lodging, baggage, misc, misc2]
+    expense_days = max(len(c) for c in expense_categories)
+    expense_matrix = np.array([pad_to_length(c, expense_days, 0.0) for c in expense_categories], dtype=np.float64)
+    grand_af, grand_gt, grand_pk, grand_lg, grand_bg, grand_m1, grand_m2 = expense_matrix.sum(axis=1)
+
+    # Misc rows follow the 7 fixed rows only when described, so the layout is the same for every chunk
+    misc_row1_idx = 7 if misc_label1 is not None else None
+    misc_row2_idx = (8 if misc_label1 is not None else 7) if misc_label2 is not None else None
+    last_row = 6 + (misc_label1 is not None) + (misc_label2 is not None)
+    expense_style = _build_expense_style(misc_row1_idx, misc_row2_idx, last_row)
 
     expense_tables = []
     expense_chunks = chunk_list(expense_dates, 7)
     total_expense_chunks = len(expense_chunks)
     for i, dates_chunk in enumerate(expense_chunks):
-        chunk_len = len(pad_to_length(dates_chunk, 7))
         pad_len = 7
-        af = pad_to_length(airfare[i*7:(i+1)*7], pad_len, 0)
-        gt = pad_to_length(ground_transport[i*7:(i+1)*7], pad_len, 0)
-        pk = pad_to_length(parking[i*7:(i+1)*7], pad_len, 0)
-        lg = pad_to_length(lodging[i*7:(i+1)*7], pad_len, 0)
-        bg = pad_to_length(baggage[i*7:(i+1)*7], pad_len, 0)
-        m1 = pad_to_length(misc[i*7:(i+1)*7], pad_len, 0)
-        m2 = pad_to_length(misc2[i*7:(i+1)*7], pad_len, 0)
+        af = _slice_pad(airfare, i*7, pad_len, 0)
+        gt = _slice_pad(ground_transport, i*7, pad_len, 0)
+        pk = _slice_pad(parking, i*7, pad_len, 0)
+        lg = _slice_pad(lodging, i*7, pad_len, 0)
+        bg = _slice_pad(baggage, i*7, pad_len, 0)
+        m1 = _slice_pad(misc, i*7, pad_len, 0)
+        m2 = _slice_pad(misc2, i*7, pad_len, 0)
         # Build expenses data - only include misc rows if descriptions are provided
+        is_last_chunk = i == total_expense_chunks - 1
         expenses_data = [
             ['Date (MM/DD/YY)'] + pad_to_length(dates_chunk, 7, '') + ['Total'],
-            ['Airfare'] + [f"${x:.2f}" if x else '' for x in af] + ([f"${grand_af:.2f}"] if i == total_expense_chunks - 1 else ['']),
-            ['Ground Transportation'] + [f"${x:.2f}" if x else '' for x in gt] + ([f"${grand_gt:.2f}"] if i == total_expense_chunks - 1 else ['']),
-            ['Parking'] + [f"${x:.2f}" if x else '' for x in pk] + ([f"${grand_pk:.2f}"] if i == total_expense_chunks - 1 else ['']),
-            ['Lodging'] + [f"${x:.2f}" if x else '' for x in lg] + ([f"${grand_lg:.2f}"] if i == total_expense_chunks - 1 else ['']),
-            ['Baggage Fees'] + [f"${x:.2f}" if x else '' for x in bg] + ([f"${grand_bg:.2f}"] if i == total_expense_chunks - 1 else ['']),
+            ['Airfare'] + _money_cells(af) + [_format_money(grand_af) if is_last_chunk else ''],
+            ['Ground Transportation'] + _money_cells(gt) + [_format_money(grand_gt) if is_last_chunk else ''],
+            ['Parking'] + _money_cells(pk) + [_format_money(grand_pk) if is_last_chunk else ''],
+            ['Lodging'] + _money_cells(lg) + [_format_money(grand_lg) if is_last_chunk else ''],
+            ['Baggage Fees'] + _money_cells(bg) + [_format_money(grand_bg) if is_last_chunk else ''],
             ['Miscellaneous/Other\n(Provide Description)'] + [''] * 7 + [''],
         ]
         
         # Only add misc rows if descriptions are provided
-        misc_row1_idx = None
-        misc_row2_idx = None
         if misc_label1 is not None:
-            expenses_data.append([misc_label1] + [f"${x:.2f}" if x else '' for x in m1] + ([f"${grand_m1:.2f}"] if i == total_expense_chunks - 1 else ['']))
-            misc_row1_idx = len(expenses_data) - 1
+            expenses_data.append([misc_label1] + _money_cells(m1) + [_format_money(grand_m1) if is_last_chunk else ''])
         if misc_label2 is not None:
-            expenses_data.append([misc_label2] + [f"${x:.2f}" if x else '' for x in m2] + ([f"${grand_m2:.2f}"] if i == total_expense_chunks - 1 else ['']))
-            misc_row2_idx = len(expenses_data) - 1
+            expenses_data.append([misc_label2] + _money_cells(m2) + [_format_money(grand_m2) if is_last_chunk else ''])
         
         expenses_table = Table(expenses_data, colWidths=[1.3*inch] + [0.65*inch]*7 + [0.75*inch])
-        
-        # Build table style - dynamically handle misc rows
-        table_style = [
-            # Left label column light gray; headers white
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E0E0E0')),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('BACKGROUND', (1, 0), (7, 0), colors.white),
-            ('TEXTCOLOR', (1, 0), (7, 0), colors.black),
-            ('TEXTCOLOR', (1, 1), (7, 5), colors.red),
-            ('BACKGROUND', (1, 1), (7, 5), colors.HexColor('#FFF5F5')),
-            ('SPAN', (0, 6), (7, 6)),  # Span across all day columns
-            ('TEXTCOLOR', (0, 6), (0, 6), colors.black),
-            ('BACKGROUND', (0, 6), (7, 6), colors.white),
-        ]
-        
-        # Add styling for misc rows only if they exist
-        if misc_row1_idx is not None:
-            table_style.extend([
-                ('TEXTCOLOR', (0, misc_row1_idx), (0, misc_row1_idx), colors.black),
-                ('BACKGROUND', (0, misc_row1_idx), (0, misc_row1_idx), colors.HexColor('#E0E0E0')),
-                ('TEXTCOLOR', (1, misc_row1_idx), (7, misc_row1_idx), colors.red),
-                ('BACKGROUND', (1, misc_row1_idx), (7, misc_row1_idx), colors.HexColor('#FFF5F5')),
-                ('TEXTCOLOR', (8, misc_row1_idx), (8, misc_row1_idx), colors.red),
-                ('BACKGROUND', (8, misc_row1_idx), (8, misc_row1_idx), colors.HexColor('#FFF5F5')),
-            ])
-        if misc_row2_idx is not None:
-            table_style.extend([
-                ('TEXTCOLOR', (0, misc_row2_idx), (0, misc_row2_idx), colors.black),
-                ('BACKGROUND', (0, misc_row2_idx), (0, misc_row2_idx), colors.HexColor('#E0E0E0')),
-                ('TEXTCOLOR', (1, misc_row2_idx), (7, misc_row2_idx), colors.red),
-                ('BACKGROUND', (1, misc_row2_idx), (7, misc_row2_idx), colors.HexColor('#FFF5F5')),
-                ('TEXTCOLOR', (8, misc_row2_idx), (8, misc_row2_idx), colors.red),
-                ('BACKGROUND', (8, misc_row2_idx), (8, misc_row2_idx), colors.HexColor('#FFF5F5')),
-            ])
-        
-        # Add common styling for totals column
-        last_row = len(expenses_data) - 1
-        table_style.extend([
-            ('TEXTCOLOR', (8, 1), (8, last_row), colors.red),
-            ('BACKGROUND', (8, 1), (8, last_row), colors.HexColor('#FFF5F5')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (7, -1), 'CENTER'),
-            ('ALIGN', (8, 0), (8, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ])
-        
-        expenses_table.setStyle(TableStyle(table_style))
+        expenses_table.setStyle(expense_style)
         expense_tables.append(expenses_table)
-    for t in expense_tables:
-        story.append(t)
-        story.append(Spacer(1, 0.15*inch))
+    story.extend(x for t in expense_tables for x in (t, Spacer(1, 0.15*inch)))
     
     # Meals and Incidentals Section
     story.append(Paragraph("<b>Meals and Incidentals Per Diem</b>", styles['Heading2']))
     story.append(Paragraph("Federal Guidelines: On the first and last travel day, travelers are only eligible for 75 percent of the total M&IE rate.", styles['Normal']))
     story.append(Spacer(1, 0.1*inch))
     
-    per_diem_dates = form_data.get('per_diem_dates', [])
-    per_diem_amounts = form_data.get('per_diem_amounts', [])  # Will be one of PER_DIEM_OPTIONS
-    breakfast_checks = form_data.get('breakfast_checks', [])
-    lunch_checks = form_data.get('lunch_checks', [])
-    dinner_checks = form_data.get('dinner_checks', [])
-    
-    # Calculate adjusted per diem for each day using dollar-based deductions
-    adjusted_per_diem = []
-    daily_totals = []
+    per_diem_dates = get('per_diem_dates', [])
+    per_diem_amounts = get('per_diem_amounts', [])  # Will be one of PER_DIEM_OPTIONS
+    breakfast_checks = get('breakfast_checks', [])
+    lunch_checks = get('lunch_checks', [])
+    dinner_checks = get('dinner_checks', [])
+    # Pad/trim the per-day lists to the number of date slots once, so nothing below needs bounds checks
+    n_per_diem_days = len(per_diem_dates)
+    per_diem_amounts = pad_to_length(per_diem_amounts[:n_per_diem_days], n_per_diem_days, 80)
+    breakfast_checks, lunch_checks, dinner_checks = (
+        pad_to_length(checks[:n_per_diem_days], n_per_diem_days, False) for checks in (breakfast_checks, lunch_checks, dinner_checks))
     
-    # Find which days have dates (non-empty)
-    days_with_dates = [i for i, d in enumerate(per_diem_dates) if d and str(d).strip()]
-    num_days = len(days_with_dates)
-    first_day_idx = days_with_dates[0] if days_with_dates else 0
-    last_day_idx = days_with_dates[-1] if days_with_dates else 0
-    
-    for i in range(len(per_diem_dates)):
-        if i < len(per_diem_dates) and per_diem_dates[i] and str(per_diem_dates[i]).strip():
-            base_per_diem = int(per_diem_amounts[i]) if (i < len(per_diem_amounts) and per_diem_amounts[i]) else 80
-            deducts = meal_deductions.get(base_per_diem, meal_deductions[80])
-            deduction_total = 0.0
-            if i < len(breakfast_checks) and breakfast_checks[i]:
-                deduction_total += deducts['breakfast']
-            if i < len(lunch_checks) and lunch_checks[i]:
-                deduction_total += deducts['lunch']
-            if i < len(dinner_checks) and dinner_checks[i]:
-                deduction_total += deducts['dinner']
-            # Base already includes incidentals; do not add +$5 here
-            pre75_total = max(0.0, float(base_per_diem) - deduction_total)
-            # Apply 75% for first and last day
-            if i == first_day_idx or i == last_day_idx:
-                final_per_diem = round(pre75_total * 0.75, 2)
-            else:
-                final_per_diem = round(pre75_total, 2)
-            
-            adjusted_per_diem.append(final_per_diem)
-            daily_totals.append(final_per_diem)
-        else:
-            adjusted_per_diem.append(0.0)
-            daily_totals.append(0.0)
-    
-    total_per_diem_calculated = sum(daily_totals)
-    
-    # Calculate daily meal totals (before 75% reduction) and total dollar reductions
-    daily_meal_totals = []
-    total_reductions = []
-    for i in range(len(per_diem_dates)):
-        if i < len(per_diem_dates) and per_diem_dates[i] and str(per_diem_dates[i]).strip():
-            base_per_diem = int(per_diem_amounts[i]) if per_diem_amounts[i] else 80
-            deducts = meal_deductions.get(base_per_diem, meal_deductions[80])
-            deduction_total = 0.0
-            if i < len(breakfast_checks) and breakfast_checks[i]:
-                deduction_total += deducts['breakfast']
-            if i < len(lunch_checks) and lunch_checks[i]:
-                deduction_total += deducts['lunch']
-            if i < len(dinner_checks) and dinner_checks[i]:
-                deduction_total += deducts['dinner']
-            total_reductions.append(round(deduction_total, 2))
-            pre75_total = max(0.0, float(base_per_diem) - deduction_total)
-            daily_meal_totals.append(round(pre75_total, 2))
-        else:
-            total_reductions.append(0.0)
-            daily_meal_totals.append(0.0)
+    # Find which days have dates (non-empty); argmax gives the first dated day without building an index list
+    dated = np.array([bool(d and str(d).strip()) for d in per_diem_dates], dtype=bool)
+    has_dated_days = bool(dated.any())
+    first_day_idx = int(dated.argmax()) if has_dated_days else 0
+    base_amounts = [int(amount) if amount else 80 for amount in per_diem_amounts] if has_dated_days else []
+    adjusted_per_diem, daily_meal_totals, total_reductions, total_per_diem_calculated = compute_per_diem(
+        dated, base_amounts, breakfast_checks, lunch_checks, dinner_checks)
     
     # Build per diem tables per 7-day chunk
     per_diem_tables = []
-    for i, dates_chunk in enumerate(chunk_list(per_diem_dates, 7)):
+    n_per_diem_chunks = (len(per_diem_dates) + 6) // 7
+    dated_days = dated.tolist()
+    # One rate applies to the whole trip, so take it from the first dated day and label every chunk with it
+    rate_amount = base_amounts[first_day_idx] if has_dated_days else 80
+    rate_labels = MEAL_DEDUCTION_LABELS.get(rate_amount, ("Breakfast -$", "Lunch -$", "Dinner -$"))
+    last_per_diem_chunk = n_per_diem_chunks - 1
+    for i in range(n_per_diem_chunks):
         idx_start = i * 7
-        pd = pad_to_length(dates_chunk, 7, '')
-        amounts = pad_to_length(per_diem_amounts[idx_start:idx_start+7], 7, 80)
-        bchk = pad_to_length(breakfast_checks[idx_start:idx_start+7], 7, False)
-        lchk = pad_to_length(lunch_checks[idx_start:idx_start+7], 7, False)
-        dchk = pad_to_length(dinner_checks[idx_start:idx_start+7], 7, False)
+        pd = _slice_pad(per_diem_dates, idx_start, 7, '')
+        amounts = _slice_pad(per_diem_amounts, idx_start, 7, 80)
+        bchk = _slice_pad(breakfast_checks, idx_start, 7, False)
+        lchk = _slice_pad(lunch_checks, idx_start, 7, False)
+        dchk = _slice_pad(dinner_checks, idx_start, 7, False)
         # Map totals slice
-        red = pad_to_length(total_reductions[idx_start:idx_start+7], 7, 0.0)
-        meal_tot = pad_to_length(daily_meal_totals[idx_start:idx_start+7], 7, 0.0)
-        adj = pad_to_length(adjusted_per_diem[idx_start:idx_start+7], 7, 0.0)
-        # Determine labels for deductions in this chunk: use the per diem amount from actual dates
-        # Find the first per diem amount that corresponds to a date (non-empty date)
-        common_amount = None
-        for j in range(len(pd)):
-            if pd[j] and str(pd[j]).strip() and j < len(amounts) and amounts[j]:
-                try:
-                    common_amount = int(amounts[j])
-                    break
-                except (ValueError, TypeError):
-                    continue
-        # If no date found in this chunk, try to get from the actual per_diem_amounts (not padded)
-        if common_amount is None and idx_start < len(per_diem_amounts):
-            for j in range(idx_start, min(idx_start + 7, len(per_diem_amounts))):
-                if j < len(per_diem_dates) and per_diem_dates[j] and str(per_diem_dates[j]).strip():
-                    try:
-                        common_amount = int(per_diem_amounts[j])
-                        break
-                    except (ValueError, TypeError):
-                        continue
-        # Default to 80 if still not found
-        if common_amount is None:
-            common_amount = 80
-        
-        if common_amount in meal_deductions:
-            b_lbl = f"Breakfast -${meal_deductions[common_amount]['breakfast']}"
-            l_lbl = f"Lunch -${meal_deductions[common_amount]['lunch']}"
-            d_lbl = f"Dinner -${meal_deductions[common_amount]['dinner']}"
-        else:
-            b_lbl = "Breakfast -$"
-            l_lbl = "Lunch -$"
-            d_lbl = "Dinner -$"
-
+        red = _slice_pad(total_reductions, idx_start, 7, 0.0)
+        meal_tot = _slice_pad(daily_meal_totals, idx_start, 7, 0.0)
+        adj = _slice_pad(adjusted_per_diem, idx_start, 7, 0.0)
+        # Which of this chunk's 7 columns hold a real date
+        pd_truth = _slice_pad(dated_days, idx_start, 7, False)
+        # Chunks without any dated day keep the $80 labels
+        b_lbl, l_lbl, d_lbl = rate_labels if any(pd_truth) else MEAL_DEDUCTION_LABELS[80]
+        amount_strs = [f"${int(x)}" if (x and pd_truth[j]) else '' for j, x in enumerate(amounts)]
         per_diem_data = [
-            ['Date (MM/DD/YY)'] + [d if d and str(d).strip() else '' for d in pd] + [''],
-            ['Per Diem Allowance'] + [f"${int(x)}" if (x and pd[j]) else '' for j, x in enumerate(amounts)] + [''],
+            ['Date (MM/DD/YY)'] + [d if pd_truth[j] else '' for j, d in enumerate(pd)] + [''],
+            ['Per Diem Allowance'] + amount_strs + [''],
             ['ADJUSTED PER DIEM', 'If meals were provided by Georgetown University (Place "x" in box)', '', '', '', '', '', ''],
-            [b_lbl] + ['X' if (bchk[j] and pd[j]) else '' for j in range(7)] + [''],
-            [l_lbl] + ['X' if (lchk[j] and pd[j]) else '' for j in range(7)] + [''],
-            [d_lbl] + ['X' if (dchk[j] and pd[j]) else '' for j in range(7)] + [''],
+            [b_lbl] + ['X' if (bchk[j] and pd_truth[j]) else '' for j in range(7)] + [''],
+            [l_lbl] + ['X' if (lchk[j] and pd_truth[j]) else '' for j in range(7)] + [''],
+            [d_lbl] + ['X' if (dchk[j] and pd_truth[j]) else '' for j in range(7)] + [''],
             ['Total Reduction ($)'] + [f"${x:.2f}" if x != 0 else '' for x in red] + [''],
             ['Daily Meal Total'] + [f"${x:.2f}" if x > 0 else '' for x in meal_tot] + [''],
-            ['Total Per Diem'] + [f"${x:.2f}" if x > 0 else '' for x in adj] + [f"${total_per_diem_calculated:.2f}" if i == len(chunk_list(per_diem_dates,7)) - 1 else ''],
+            ['Total Per Diem'] + [f"${x:.2f}" if x > 0 else '' for x in adj] + [f"${total_per_diem_calculated:.2f}" if i == last_per_diem_chunk else ''],
         ]
         per_diem_table = Table(per_diem_data, colWidths=[1.3*inch] + [0.6*inch]*7 + [0.75*inch])
-        per_diem_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E0E0E0')),
-            # Date row and header white
-            ('BACKGROUND', (1, 0), (7, 0), colors.white),
-            ('TEXTCOLOR', (1, 0), (7, 0), colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('TEXTCOLOR', (1, 1), (-1, -1), colors.red),
-            ('BACKGROUND', (1, 1), (-1, -1), colors.HexColor('#FFF5F5')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('SPAN', (0, 2), (7, 2)),
-            ('BACKGROUND', (0, 2), (7, 2), colors.HexColor('#FFF5F5')),
-            ('TEXTCOLOR', (0, 2), (7, 2), colors.red),
-            ('TEXTCOLOR', (8, -1), (8, -1), colors.red),
-            ('BACKGROUND', (8, -1), (8, -1), colors.HexColor('#FFF5F5')),
-        ]))
+        per_diem_table.setStyle(per_diem_table_style)
         per_diem_tables.append(per_diem_table)
-    for t in per_diem_tables:
-        story.append(t)
-        story.append(Spacer(1, 0.15*inch))
+    story.extend(x for t in per_diem_tables for x in (t, Spacer(1, 0.15*inch)))
     
     # Totals Section
-    total_mileage = form_data.get('total_mileage', 0)
-    total_airfare = form_data.get('total_airfare', 0)
-    total_ground_transport = form_data.get('total_ground_transport', 0)
-    total_parking = form_data.get('total_parking', 0)
-    total_lodging = form_data.get('total_lodging', 0)
-    total_baggage = form_data.get('total_baggage', 0)
-    total_misc = form_data.get('total_misc', 0)
-    total_per_diem = form_data.get('total_per_diem', 0)
+    total_mileage = get('total_mileage', 0)
+    total_airfare = get('total_airfare', 0)
+    total_ground_transport = get('total_ground_transport', 0)
+    total_parking = get('total_parking', 0)
+    total_lodging = get('total_lodging', 0)
+    total_baggage = get('total_baggage', 0)
+    total_misc = get('total_misc', 0)
+    total_per_diem = get('total_per_diem', 0)
     
     # Calculate subtotal
     subtotal = total_mileage + total_airfare + total_ground_transport + total_parking + total_lodging + total_baggage + total_misc + total_per_diem
@@ -827,32 +882,14 @@ def create_pdf(form_data, ws):
     ]
     
     totals_table = Table(totals_data, colWidths=[3*inch, 1.5*inch])
-    totals_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.white),
-        ('TEXTCOLOR', (1, 0), (1, 7), colors.red),
-        ('BACKGROUND', (1, 0), (1, 7), colors.HexColor('#FFF5F5')),
-        ('BACKGROUND', (0, 8), (0, 8), colors.white),
-        ('BACKGROUND', (1, 8), (1, 8), colors.HexColor('#FFF5F5')),
-        ('TEXTCOLOR', (1, 8), (1, 8), colors.red),
-        ('FONTNAME', (0, 8), (0, 8), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.white]),
-        ('TEXTCOLOR', (0, 9), (1, 9), colors.red),
-        ('BACKGROUND', (0, 9), (1, 9), colors.white),
-        ('FONTNAME', (0, 9), (1, 9), 'Helvetica-Bold'),
-    ]))
+    totals_table.setStyle(totals_table_style)
     story.append(totals_table)
     story.append(Spacer(1, 0.15*inch))
 
 
     story.append(Paragraph("<b>Approval Signatures</b>", styles['Heading2']))
     # Signature section
-    signature_text = form_data.get('signature', '').strip()
+    signature_text = get('signature', '').strip()
     
     # Create signature cell with image or text
     signature_cell_value = ''
@@ -860,25 +897,17 @@ def create_pdf(form_data, ws):
     # Generate signature image from text
     if signature_text:
         try:
-            # Generate signature image from text with high resolution (3x scale)
-            signature_img_pil = generate_signature_image(signature_text, width=800, height=150, scale_factor=3)
+            # Generate signature image from text with high resolution (2x supersample)
+            signature_png = generate_signature_image_cached(signature_text, width=800, height=150, scale_factor=2)
             
-            if signature_img_pil:
-                # Ensure it's RGB with white background (blank)
-                if signature_img_pil.mode != 'RGB':
-                    rgb_img = PILImage.new('RGB', signature_img_pil.size, (255, 255, 255))
-                    if signature_img_pil.mode == 'RGBA':
-                        rgb_img.paste(signature_img_pil, mask=signature_img_pil.split()[3])
-                    else:
-                        rgb_img.paste(signature_img_pil)
-                    signature_img_pil = rgb_img
-                
+            if signature_png:
                 # Resize signature to fit the table cell (cell width is 2 inches, accounting for padding)
                 # Cell has 6pt left/right padding, so available width is ~1.88 inches
                 max_width = 1.88 * inch
                 max_height = 0.5 * inch  # Reduced height to fit better in cell
                 
-                img_width, img_height = signature_img_pil.size
+                # The cached PNG is already RGB on white; only its header is read here for the size
+                img_width, img_height = PILImage.open(io.BytesIO(signature_png)).size
                 aspect_ratio = img_height / img_width if img_width > 0 else 1
                 
                 # Calculate size maintaining aspect ratio but respecting both max width and height
@@ -892,15 +921,8 @@ def create_pdf(form_data, ws):
                 # Ensure width doesn't exceed cell width
                 new_width = min(new_width, max_width)
                 
-                # Save to buffer for ReportLab with high quality
-                img_buffer = io.BytesIO()
-                # Save at full resolution for maximum clarity
-                signature_img_pil.save(img_buffer, format='PNG', optimize=False, compress_level=1)
-                img_buffer.seek(0)
-                
-                # Create ReportLab Image - use the calculated dimensions
-                # The image will be high-res internally but displayed at the correct size
-                signature_img = Image(img_buffer, width=new_width, height=new_height)
+                # Embed the cached full-resolution PNG as-is, displayed at the calculated size
+                signature_img = Image(io.BytesIO(signature_png), width=new_width, height=new_height)
                 signature_cell_value = signature_img
             else:
                 signature_cell_value = signature_text
@@ -910,51 +932,85 @@ def create_pdf(form_data, ws):
     
     # Combined Approval Signatures and Operations Use Only table
     # Use Paragraph for all labels to ensure consistent font size and width
-    label_style = ParagraphStyle(
-        'LabelStyle',
-        parent=styles['Normal'],
-        fontSize=9,
-        fontName='Helvetica',
-        alignment=0,  # LEFT
-    )
-    
     traveler_label = Paragraph("Traveler Signature", label_style)
     program_assistant_label = Paragraph("Program Assistant", label_style)
     lead_provider_text = Paragraph("Lead Technical\nAssistance Provider", label_style)
     
     combined_data = [
-        [traveler_label, signature_cell_value, 'DATE', form_data.get('signature_date', '')],
+        [traveler_label, signature_cell_value, 'DATE', get('signature_date', '')],
         [program_assistant_label, '', 'DATE', ''],
         [lead_provider_text, '', 'DATE', ''],
         ['AWD', 'AWD-7776588', 'GR', 'GR426936'],
     ]
     
     combined_table = Table(combined_data, colWidths=[1.5*inch, 2*inch, 0.8*inch, 1.5*inch])
-    combined_table.setStyle(TableStyle([
-        # Grid and alignment for all rows
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        # Padding for all rows
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        # Traveler Signature row (row 0) - all white background, signature/date cells red text
-        ('BACKGROUND', (0, 0), (-1, 0), colors.white),
-        ('TEXTCOLOR', (1, 0), (1, 0), colors.red),
-        ('TEXTCOLOR', (3, 0), (3, 0), colors.red),
-        # Operations rows (rows 1-3) - all white background
-        ('BACKGROUND', (0, 1), (-1, 3), colors.white),
-    ]))
+    combined_table.setStyle(signature_table_style)
     story.append(combined_table)
     
     # Build PDF
     doc.build(story)
     buffer.seek(0)
-    return buffer
+    return buffer, left_logo is not None and right_logo is not None
+
+# Cells shared by every category row of the totals table
+REVIEW_TD = "<td style='padding:8px;border-bottom:1px solid #f0f0f0;'>"
+REVIEW_TD_AMOUNT = "<td style='padding:8px;text-align:right;'>"
+REVIEW_TOTAL_LABELS = ("Mileage", "Airfare", "Ground Transport", "Parking", "Lodging", "Baggage",
+                       "Miscellaneous", "Per Diem")
+REVIEW_TOTAL_KEYS = ("total_mileage", "total_airfare", "total_ground_transport", "total_parking", "total_lodging",
+                     "total_baggage", "total_misc", "total_per_diem")
+
+# Review & Approve pane markup, filled with str.format_map on each rerun. One markdown block: Traveler and
+# Trip cards side by side (stacking on narrow screens like st.columns did), then the totals table.
+# No blank lines, so markdown keeps it one HTML block.
+REVIEW_HTML = """
+<div style='display:grid;grid-template-columns:repeat(auto-fit,minmax(260px,1fr));gap:16px;margin-bottom:16px;'>
+<div>
+  <p style='margin:0 0 8px;'><strong>Traveler</strong></p>
+  <div style='border:1px solid #e0e0e0;border-radius:8px;padding:12px;background:#fafafa;'>
+    <div style='display:flex;justify-content:space-between;padding:4px 0;'>
+      <span style='color:#555;'>Name</span><strong>{name}</strong>
+    </div>
+    <div style='display:flex;justify-content:space-between;padding:4px 0;'>
+      <span style='color:#555;'>Organization</span><strong>{organization}</strong>
+    </div>
+    <div style='display:flex;justify-content:space-between;padding:4px 0;'>
+      <span style='color:#555;'>Destination</span><strong>{destination}</strong>
+    </div>
+    <div style='display:flex;justify-content:space-between;padding:4px 0;'>
+      <span style='color:#555;'>Email</span><strong>{email}</strong>
+    </div>
+  </div>
+</div>
+<div>
+  <p style='margin:0 0 8px;'><strong>Trip</strong></p>
+  <div style='border:1px solid #e0e0e0;border-radius:8px;padding:12px;background:#fafafa;'>
+    <div style='display:flex;justify-content:space-between;padding:4px 0;'>
+      <span style='color:#555;'>Departure Date</span><strong>{departure_date}</strong>
+    </div>
+    <div style='display:flex;justify-content:space-between;padding:4px 0;'>
+      <span style='color:#555;'>Return Date</span><strong>{return_date}</strong>
+    </div>
+  </div>
+</div>
+</div>
+<p style='margin:0 0 8px;'><strong>Totals</strong></p>
+<table style='width:100%;border-collapse:collapse;border:1px solid #eee;'>
+  <thead>
+    <tr style='background:#f5f5f5;'>
+      <th style='text-align:left;padding:8px;border-bottom:1px solid #eee;'>Category</th>
+      <th style='text-align:right;padding:8px;border-bottom:1px solid #eee;'>Amount</th>
+    </tr>
+  </thead>
+  <tbody>
+    {rows}
+    <tr style='background:#fff8f8;font-weight:600;'>
+      <td style='padding:8px;border-top:1px solid #eee;'>Total Amount Due</td>
+      <td style='padding:8px;text-align:right;border-top:1px solid #eee;'>{amount_due}</td>
+    </tr>
+  </tbody>
+</table>
+"""
 
 def main():
     # Header with logo and title
@@ -1020,14 +1076,12 @@ def main():
         
         # Track date changes to auto-populate date fields
         # Initialize session state for date tracking
-        if 'last_departure' not in st.session_state:
-            st.session_state.last_departure = departure_date
-        if 'last_return' not in st.session_state:
-            st.session_state.last_return = return_date
+        last_departure = st.session_state.setdefault('last_departure', departure_date)
+        last_return = st.session_state.setdefault('last_return', return_date)
         
         # Check if dates changed
-        dates_changed = (departure_date != st.session_state.last_departure or 
-                       return_date != st.session_state.last_return)
+        dates_changed = (departure_date != last_departure or 
+                       return_date != last_return)
         
         # Compute total days and generate full date range
         if departure_date and return_date and return_date >= departure_date:
@@ -1042,27 +1096,21 @@ def main():
         if dates_changed:
             st.session_state.last_departure = departure_date
             st.session_state.last_return = return_date
-            # Update all date fields with new defaults when dates change
-            # Clear previous keys generously then set new defaults
-            for i in range(0, 100):
-                if i < len(default_dates) and default_dates[i]:
-                    st.session_state[f'mileage_date_{i}'] = default_dates[i]
-                    st.session_state[f'expense_date_{i}'] = default_dates[i]
-                    st.session_state[f'per_diem_date_{i}'] = default_dates[i]
-                else:
-                    # Clear if beyond date range
-                    st.session_state[f'mileage_date_{i}'] = ''
-                    st.session_state[f'expense_date_{i}'] = ''
-                    st.session_state[f'per_diem_date_{i}'] = ''
+            # Update all date fields with new defaults when dates change; clear any slots
+            # left over from a longer previous range, skipping keys that already match
+            prev_total_days = st.session_state.get('_prev_total_days', 0)
+            for i in range(max(total_days, prev_total_days)):
+                new_date = default_dates[i] if i < len(default_dates) and default_dates[i] else ''
+                for key in (f'mileage_date_{i}', f'expense_date_{i}', f'per_diem_date_{i}'):
+                    if st.session_state.get(key) != new_date:
+                        st.session_state[key] = new_date
         else:
             # Initialize session state on first load if not exists
             for i in range(total_days):
-                if f'mileage_date_{i}' not in st.session_state:
-                    st.session_state[f'mileage_date_{i}'] = default_dates[i] if i < len(default_dates) else ''
-                if f'expense_date_{i}' not in st.session_state:
-                    st.session_state[f'expense_date_{i}'] = default_dates[i] if i < len(default_dates) else ''
-                if f'per_diem_date_{i}' not in st.session_state:
-                    st.session_state[f'per_diem_date_{i}'] = default_dates[i] if i < len(default_dates) else ''
+                default_date = default_dates[i] if i < len(default_dates) else ''
+                for key in (f'mileage_date_{i}', f'expense_date_{i}', f'per_diem_date_{i}'):
+                    st.session_state.setdefault(key, default_date)
+        st.session_state['_prev_total_days'] = total_days
         
         with st.form("travel_form"):
             st.header("Traveler Information")
@@ -1100,7 +1148,7 @@ def main():
                         mileage_dates.append(st.text_input(f"Day {i+1}", key=f"mileage_date_{i}", placeholder="MM/DD/YY"))
                         mileage_amounts.append(number_text_input(f"Miles", key=f"mileage_{i}", value=0.0, placeholder="0"))
             
-            total_mileage = round(sum([m * 0.70 for m in mileage_amounts if m]),0)
+            total_mileage = round(sum(m * 0.70 for m in mileage_amounts if m), 0)
             
             st.header("Travel Expenses")
             expense_dates = []
@@ -1151,7 +1199,7 @@ def main():
             st.header("Meals and Incidentals Per Diem")
             st.markdown("**Please confirm the official GSA per diem rate for your travel destination at https://www.gsa.gov/travel/plan-book/per-diem-rates and select the corresponding rate below.**")
             # Single per diem selection for all days
-            selected_per_diem = st.selectbox("Per Diem Rate (applies to all days)", options=[68,74,80,86,92], index=2, key="per_diem_base")
+            selected_per_diem = st.selectbox("Per Diem Rate (applies to all days)", options=PER_DIEM_RATES, index=DEFAULT_RATE_INDEX, key="per_diem_base")
             per_diem_dates = []
             per_diem_amounts = []
             breakfast_checks = []
@@ -1180,21 +1228,12 @@ def main():
                 signature_text = st.text_input("Type your full name", key="signature_text", 
                                               help="Your typed name will be automatically converted to a signature-style image")
                 if signature_text:
-                    # Show preview of signature (use lower scale for preview to be faster)
+                    # Show preview of signature (rendered at final resolution for speed)
                     try:
-                        preview_img = generate_signature_image(signature_text, width=600, height=120, scale_factor=2)
-                        if preview_img:
-                            # Ensure it's RGB for display (should already be RGB now)
-                            if preview_img.mode != 'RGB':
-                                rgb_preview = PILImage.new('RGB', preview_img.size, (255, 255, 255))
-                                if preview_img.mode == 'RGBA':
-                                    rgb_preview.paste(preview_img, mask=preview_img.split()[3])
-                                else:
-                                    rgb_preview.paste(preview_img)
-                                preview_img = rgb_preview
-                            # Resize preview for display
-                            preview_display = preview_img.resize((400, int(400 * preview_img.size[1] / preview_img.size[0])))
-                            st.image(preview_display, caption="Signature Preview", width=400)
+                        preview_png = generate_signature_image_cached(signature_text, width=600, height=120)
+                        if preview_png:
+                            # Cached PNG is already RGB; let the browser scale it to the preview width
+                            st.image(preview_png, caption="Signature Preview", width=400)
                     except Exception as e:
                         pass
             with col2:
@@ -1206,90 +1245,46 @@ def main():
         
         if submitted:
             # Validate required Traveler Information fields
-            missing_fields = []
-            if not name or not name.strip():
-                missing_fields.append("Name")
-            if not address1 or not address1.strip():
-                missing_fields.append("Address Line 1")
-            if not city or not city.strip():
-                missing_fields.append("City")
-            if not state or not state.strip():
-                missing_fields.append("State")
-            if not zip_code or not zip_code.strip():
-                missing_fields.append("Zip")
-            if not destination or not destination.strip():
-                missing_fields.append("Destination")
-            if not email or not email.strip():
-                missing_fields.append("Email Address")
+            required_fields = (
+                ("Name", name),
+                ("Address Line 1", address1),
+                ("City", city),
+                ("State", state),
+                ("Zip", zip_code),
+                ("Destination", destination),
+                ("Email Address", email),
+            )
+            missing_fields = [label for label, value in required_fields if not (value and value.strip())]
             
             if missing_fields:
                 st.warning(f"⚠️ Please fill in all required fields: {', '.join(missing_fields)}")
                 st.stop()
             
-            # Check for any input validation errors (check all number inputs)
-            has_validation_errors = False
-            # Check all input keys that might have errors
-            input_prefixes = ['mileage_', 'airfare_', 'ground_', 'parking_', 'lodging_', 'baggage_', 'misc_', 'misc2_']
-            for key in st.session_state.keys():
-                if key.endswith('_has_error') and st.session_state[key]:
-                    # Check if this is one of our input fields
-                    base_key = key.replace('_has_error', '')
-                    if any(base_key.startswith(prefix) for prefix in input_prefixes):
-                        has_validation_errors = True
-                        break
+            # Check for any input validation errors (number inputs register themselves when invalid)
+            has_validation_errors = bool(st.session_state.get('_error_keys'))
             
             if has_validation_errors:
                 st.warning("⚠️ **Cannot generate PDF: Please fix all invalid input fields above.**")
                 st.stop()
             # Calculate totals
-            total_airfare = sum(airfare)
-            total_ground_transport = sum(ground_transport)
-            total_parking = sum(parking)
-            total_lodging = sum(lodging)
-            total_baggage = sum(baggage)
-            total_misc = sum(misc) + sum(misc2)  # Include both misc rows in total
-            # Calculate adjusted per diem with meal deductions
-            days_with_dates = [i for i, d in enumerate(per_diem_dates) if d and str(d).strip()]
-            num_days = len(days_with_dates)
-            first_day_idx = days_with_dates[0] if days_with_dates else 0
-            last_day_idx = days_with_dates[-1] if days_with_dates else 0
+            # Every expense row has one entry per day, so all seven sum in one NumPy reduction
+            # (the same way the PDF's expense grand totals are computed)
+            (total_airfare, total_ground_transport, total_parking, total_lodging, total_baggage,
+             total_misc1, total_misc2) = np.array([airfare, ground_transport, parking, lodging, baggage, misc, misc2],
+                                                  dtype=np.float64).sum(axis=1).tolist()
+            total_misc = total_misc1 + total_misc2  # Include both misc rows in total
+            # Calculate adjusted per diem with meal deductions (same reducer the PDF tables use)
+            dated = np.array([bool(d and str(d).strip()) for d in per_diem_dates], dtype=bool)
+            _, _, _, total_per_diem = compute_per_diem(dated, per_diem_amounts, breakfast_checks, lunch_checks, dinner_checks)
             
-            meal_deductions = {
-                68: { 'breakfast': 16, 'lunch': 19, 'dinner': 28, 'incidental': 5, 'first_last': 51.00 },
-                74: { 'breakfast': 18, 'lunch': 20, 'dinner': 31, 'incidental': 5, 'first_last': 55.50 },
-                80: { 'breakfast': 20, 'lunch': 22, 'dinner': 33, 'incidental': 5, 'first_last': 60.00 },
-                86: { 'breakfast': 22, 'lunch': 23, 'dinner': 36, 'incidental': 5, 'first_last': 64.50 },
-                92: { 'breakfast': 23, 'lunch': 26, 'dinner': 38, 'incidental': 5, 'first_last': 69.00 },
-            }
-            adjusted_per_diem_daily = []
-            for i in range(len(per_diem_dates)):
-                if i < len(per_diem_dates) and per_diem_dates[i] and str(per_diem_dates[i]).strip():
-                    base_per_diem = int(per_diem_amounts[i]) if (i < len(per_diem_amounts) and per_diem_amounts[i]) else 80
-                    deducts = meal_deductions.get(base_per_diem, meal_deductions[80])
-                    deduction_total = 0.0
-                    if i < len(breakfast_checks) and breakfast_checks[i]:
-                        deduction_total += deducts['breakfast']
-                    if i < len(lunch_checks) and lunch_checks[i]:
-                        deduction_total += deducts['lunch']
-                    if i < len(dinner_checks) and dinner_checks[i]:
-                        deduction_total += deducts['dinner']
-                    # Base already includes incidentals; do not add +$5 here
-                    pre75_total = max(0.0, float(base_per_diem) - deduction_total)
-                    # Apply 75% for first and last day
-                    if i == first_day_idx or i == last_day_idx:
-                        final_per_diem = round(pre75_total * 0.75, 2)
-                    else:
-                        final_per_diem = round(pre75_total, 2)
-                    
-                    adjusted_per_diem_daily.append(final_per_diem)
-                else:
-                    adjusted_per_diem_daily.append(0.0)
-            
-            total_per_diem = sum(adjusted_per_diem_daily)
             total_amount_due = (total_mileage + total_airfare + total_ground_transport + 
                               total_parking + total_lodging + total_baggage + 
                               total_misc + total_per_diem)
             
+            # Each date is formatted once; the review pane and PDF file name reuse these strings
+            departure_str = departure_date.strftime('%m/%d/%Y') if departure_date else ''
+            return_str = return_date.strftime('%m/%d/%Y') if return_date else ''
+            signature_date_str = signature_date.strftime('%m/%d/%Y') if signature_date else ''
             form_data = {
                 'name': name,
                 'address1': address1,
@@ -1299,8 +1294,8 @@ def main():
                 'zip': zip_code,
                 'organization': organization,
                 'destination': destination,
-                'departure_date': departure_date.strftime('%m/%d/%Y') if departure_date else '',
-                'return_date': return_date.strftime('%m/%d/%Y') if return_date else '',
+                'departure_date': departure_str,
+                'return_date': return_str,
                 'email': email,
                 'mileage_dates': mileage_dates,
                 'mileage_amounts': mileage_amounts,
@@ -1329,84 +1324,54 @@ def main():
                 'total_per_diem': total_per_diem,
                 'total_amount_due': total_amount_due,
                 'signature': signature,
-                'signature_date': signature_date.strftime('%m/%d/%Y') if signature_date else ''
+                'signature_date': signature_date_str
             }
-            # Store for review step
+            # Store for review step; the per-day lists are kept with the totals so the PDF is
+            # built from exactly what was reviewed, not from widgets that may have changed since
             st.session_state['review_data'] = form_data
             st.success("Please review the information below and approve to finalize.")
 
         # Review & Approve pane
-        if 'review_data' in st.session_state:
-            review = st.session_state['review_data']
+        review = st.session_state.get('review_data')
+        if review is not None:
+            # Read every displayed field once; the templates below only receive locals
+            get = review.get
+            review_name = get('name', '')
+            review_departure = get('departure_date', '')
+            review_return = get('return_date', '')
+            # review_data is always built with every total, so a plain get per key is enough
+            mileage_total, *other_totals = map(get, REVIEW_TOTAL_KEYS)
+            total_strs = [f"${int(mileage_total)}"] + [f"${value:.2f}" for value in other_totals]
             st.subheader("Review & Approve")
-            colA, colB = st.columns(2)
-            with colA:
-                st.markdown("**Traveler**")
-                traveler_html = f"""
-                <div style='border:1px solid #e0e0e0;border-radius:8px;padding:12px;background:#fafafa;'>
-                  <div style='display:flex;justify-content:space-between;padding:4px 0;'>
-                    <span style='color:#555;'>Name</span><strong>{review.get('name','')}</strong>
-                  </div>
-                  <div style='display:flex;justify-content:space-between;padding:4px 0;'>
-                    <span style='color:#555;'>Organization</span><strong>{review.get('organization','')}</strong>
-                  </div>
-                  <div style='display:flex;justify-content:space-between;padding:4px 0;'>
-                    <span style='color:#555;'>Destination</span><strong>{review.get('destination','')}</strong>
-                  </div>
-                  <div style='display:flex;justify-content:space-between;padding:4px 0;'>
-                    <span style='color:#555;'>Email</span><strong>{review.get('email','')}</strong>
-                  </div>
-                </div>
-                """
-                st.markdown(traveler_html, unsafe_allow_html=True)
-            with colB:
-                st.markdown("**Trip**")
-                trip_html = f"""
-                <div style='border:1px solid #e0e0e0;border-radius:8px;padding:12px;background:#fafafa;'>
-                  <div style='display:flex;justify-content:space-between;padding:4px 0;'>
-                    <span style='color:#555;'>Departure Date</span><strong>{review.get('departure_date','')}</strong>
-                  </div>
-                  <div style='display:flex;justify-content:space-between;padding:4px 0;'>
-                    <span style='color:#555;'>Return Date</span><strong>{review.get('return_date','')}</strong>
-                  </div>
-                </div>
-                """
-                st.markdown(trip_html, unsafe_allow_html=True)
-            st.markdown("**Totals**")
-            totals_html = f"""
-            <table style='width:100%;border-collapse:collapse;border:1px solid #eee;'>
-              <thead>
-                <tr style='background:#f5f5f5;'>
-                  <th style='text-align:left;padding:8px;border-bottom:1px solid #eee;'>Category</th>
-                  <th style='text-align:right;padding:8px;border-bottom:1px solid #eee;'>Amount</th>
-                </tr>
-              </thead>
-              <tbody>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Mileage</td><td style='padding:8px;text-align:right;'>${int(review.get('total_mileage',0))}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Airfare</td><td style='padding:8px;text-align:right;'>${review.get('total_airfare',0):.2f}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Ground Transport</td><td style='padding:8px;text-align:right;'>${review.get('total_ground_transport',0):.2f}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Parking</td><td style='padding:8px;text-align:right;'>${review.get('total_parking',0):.2f}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Lodging</td><td style='padding:8px;text-align:right;'>${review.get('total_lodging',0):.2f}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Baggage</td><td style='padding:8px;text-align:right;'>${review.get('total_baggage',0):.2f}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Miscellaneous</td><td style='padding:8px;text-align:right;'>${review.get('total_misc',0):.2f}</td></tr>
-                <tr><td style='padding:8px;border-bottom:1px solid #f0f0f0;'>Per Diem</td><td style='padding:8px;text-align:right;'>${review.get('total_per_diem',0):.2f}</td></tr>
-                <tr style='background:#fff8f8;font-weight:600;'>
-                  <td style='padding:8px;border-top:1px solid #eee;'>Total Amount Due</td>
-                  <td style='padding:8px;text-align:right;border-top:1px solid #eee;'>${review.get('total_amount_due',0):.2f}</td>
-                </tr>
-              </tbody>
-            </table>
-            """
-            st.markdown(totals_html, unsafe_allow_html=True)
+            rows_html = "\n    ".join(
+                f"<tr>{REVIEW_TD}{label}</td>{REVIEW_TD_AMOUNT}{value}</td></tr>"
+                for label, value in zip(REVIEW_TOTAL_LABELS, total_strs))
+            review_html = REVIEW_HTML.format_map({
+                'name': review_name, 'organization': get('organization', ''),
+                'destination': get('destination', ''), 'email': get('email', ''),
+                'departure_date': review_departure, 'return_date': review_return,
+                'rows': rows_html, 'amount_due': f"${get('total_amount_due', 0):.2f}",
+            })
+            st.markdown(review_html, unsafe_allow_html=True)
             approved = st.checkbox("I have reviewed and approve this travel form.", key="approve_review")
             generate_now = st.button("Finalize and Download PDF", disabled=not approved)
             if generate_now and approved:
-                pdf_buffer = create_pdf(review, ws)
+                # Identical form data (e.g. the same form submitted and finalized again) reuses the last PDF
+                pdf_key = hashlib.blake2b(json.dumps(review, default=str, sort_keys=True).encode(), digest_size=16).hexdigest()
+                if st.session_state.get('_pdf_key') == pdf_key:
+                    pdf_buffer = st.session_state['_pdf_bytes']
+                else:
+                    buffer, logos_loaded = create_pdf(review, ws)
+                    pdf_buffer = buffer.getvalue()
+                    # A PDF missing a logo isn't kept, so the next finalize retries the fetch
+                    if logos_loaded:
+                        st.session_state['_pdf_bytes'] = pdf_buffer
+                        st.session_state['_pdf_key'] = pdf_key
                 st.success("✅ PDF generated successfully!")
                 st.download_button(
                     label="📥 Download PDF",
                     data=pdf_buffer,
-                    file_name=f"Travel_Authorization_Form_{review.get('name','')}_{review.get('departure_date','')}_{review.get('return_date','')}.pdf",
+                    file_name=f"Travel_Authorization_Form_{review_name}_{review_departure}_{review_return}.pdf",
                     mime="application/pdf"
                 )
                 # Clear review data after generation